@@ -6,39 +6,76 @@
 
 import json
 import os
+import sys
 import csv
 import zipfile
 import re
 import shutil
+import heapq
+import mmap
+import time
+from itertools import islice
+from operator import itemgetter
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple, Set
-import pytz
+from typing import Dict, List, NamedTuple, Optional, Tuple, Set
+from zoneinfo import ZoneInfo
+
+try:
+    import orjson
+except ImportError:  # 未安裝 orjson 時退回標準函式庫 json
+    orjson = None
 
 # ========== 配置區域 ==========
-TAIPEI_TZ = pytz.timezone('Asia/Taipei')
+TAIPEI_TZ = ZoneInfo('Asia/Taipei')
+
+class GameConfig(NamedTuple):
+    """單一遊戲的設定（以屬性存取，比字典查找更省）"""
+    api_path: Optional[str]  # API端點，None 表示沒有API
+    number_count: int
+    has_special: bool
+    number_range: Tuple[int, int]  # 號碼合法範圍 [最小, 最大]
+    csv_number_cols: Tuple[int, int]  # CSV 獎號欄位 [起, 迄)
+    csv_special_col: Optional[int]  # CSV 特別號欄位，None 表示沒有特別號
+    sort_numbers: bool
 
 # 各遊戲的API端點配置
 GAME_API_CONFIG = {
-    "大樂透": {
-        "api_path": "/Lotto649Result",
-        "number_count": 6,
-        "has_special": True
-    },
-    "威力彩": {
-        "api_path": "/SuperLotto638Result", 
-        "number_count": 6,
-        "has_special": True
-    },
-    "今彩539": {
-        "api_path": "/DailyCashResult",
-        "number_count": 5,
-        "has_special": False
-    },
-    "3星彩": {
-        "api_path": None,  # 暫時沒有API
-        "number_count": 3,
-        "has_special": False
-    }
+    "大樂透": GameConfig(
+        api_path="/Lotto649Result",
+        number_count=6,
+        has_special=True,
+        number_range=(1, 49),
+        csv_number_cols=(6, 12),
+        csv_special_col=12,
+        sort_numbers=True
+    ),
+    "威力彩": GameConfig(
+        api_path="/SuperLotto638Result",
+        number_count=6,
+        has_special=True,
+        number_range=(1, 38),
+        csv_number_cols=(6, 12),
+        csv_special_col=12,
+        sort_numbers=True
+    ),
+    "今彩539": GameConfig(
+        api_path="/DailyCashResult",
+        number_count=5,
+        has_special=False,
+        number_range=(1, 39),
+        csv_number_cols=(6, 11),
+        csv_special_col=None,
+        sort_numbers=True
+    ),
+    "3星彩": GameConfig(
+        api_path=None,  # 暫時沒有API
+        number_count=3,
+        has_special=False,
+        number_range=(0, 9),
+        csv_number_cols=(6, 9),
+        csv_special_col=None,
+        sort_numbers=False  # 3星彩號碼有順序，不排序
+    )
 }
 
 # 民國年轉西元年對照表（110年-114年）
@@ -51,13 +88,46 @@ ROCN_YEAR_MAP = {
     115: 2026
 }
 
+# log() 各等級對應的圖示
+LOG_ICONS = {"INFO": "ℹ️", "SUCCESS": "✅", "WARNING": "⚠️", "ERROR": "❌", "IMPORT": "📥", "ZIP": "📦"}
+
+# log() 時間戳記快取: (秒數, 格式化字串)，整組替換以確保多執行緒下一致
+_log_timestamp_cache = (None, "")
+
 # ========== 共用工具函數 ==========
+def dumps_json(obj) -> bytes:
+    """序列化為 UTF-8 JSON（縮排2格），優先使用 orjson，輸出與 json.dump 相同"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8')
+
+def loads_json(raw):
+    """解析 UTF-8 JSON 位元組（bytes 或 memoryview），優先使用 orjson"""
+    if orjson is not None:
+        return orjson.loads(raw)
+    # 標準函式庫 json 不接受 memoryview，需先轉為 bytes
+    if isinstance(raw, memoryview):
+        raw = raw.tobytes()
+    return json.loads(raw)
+
+def parse_ymd(date_str: str) -> datetime:
+    """解析資料庫中的 YYYY-MM-DD 日期字串（fromisoformat 為C實作，比 strptime 快且會驗證格式）"""
+    return datetime.fromisoformat(date_str)
+
 def log(message: str, level: str = "INFO"):
     """統一日誌輸出函數"""
-    timestamp = datetime.now(TAIPEI_TZ).strftime('%Y-%m-%d %H:%M:%S')
-    icons = {"INFO": "ℹ️", "SUCCESS": "✅", "WARNING": "⚠️", "ERROR": "❌", "IMPORT": "📥", "ZIP": "📦"}
-    icon = icons.get(level, "ℹ️")
-    print(f"[{timestamp}] {icon} {message}")
+    global _log_timestamp_cache
+    
+    # 同一秒內的日誌共用已格式化的時間戳記，避免每次都做時區轉換與 strftime
+    second = int(time.time())
+    cached_second, timestamp = _log_timestamp_cache
+    if second != cached_second:
+        timestamp = datetime.fromtimestamp(second, TAIPEI_TZ).strftime('%Y-%m-%d %H:%M:%S')
+        _log_timestamp_cache = (second, timestamp)
+    
+    icon = LOG_ICONS.get(level, "ℹ️")
+    # 整行（含換行）以單次 write 輸出，多執行緒同時記錄時各行不會互相穿插
+    sys.stdout.write(f"[{timestamp}] {icon} {message}\n")
 
 def load_existing_data() -> Dict:
     """載入現有的JSON資料庫"""
@@ -65,13 +135,15 @@ def load_existing_data() -> Dict:
     
     if os.path.exists(data_file):
         try:
-            with open(data_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            # 以 mmap 映射檔案後直接解析，省去 f.read() 產生的整份複本
+            with open(data_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                with memoryview(mm) as view:
+                    data = loads_json(view)
             
-            # 確保資料按日期正序排列（舊到新）
+            # 確保資料按日期正序排列（舊到新）；save_data 存檔時已排序，通常可略過
             for game in data.values():
-                if game:
-                    game.sort(key=lambda x: x['date'])
+                if game and any(prev['date'] > cur['date'] for prev, cur in zip(game, islice(game, 1, None))):
+                    game.sort(key=itemgetter('date'))
             
             total_records = sum(len(records) for records in data.values())
             log(f"載入現有資料庫: {len(data)} 種遊戲, {total_records} 筆紀錄", "INFO")
@@ -84,7 +156,8 @@ def load_existing_data() -> Dict:
 
 def merge_and_deduplicate(existing: Dict, new_data: Dict) -> Tuple[Dict, int]:
     """合併新舊資料並去除重複"""
-    merged = {game: draws.copy() for game, draws in existing.items()}
+    # 淺複製即可：有新資料的遊戲會以 heapq.merge 產生新列表，不會修改原列表
+    merged = dict(existing)
     total_added = 0
     
     for game_name, new_draws in new_data.items():
@@ -97,52 +170,101 @@ def merge_and_deduplicate(existing: Dict, new_data: Dict) -> Tuple[Dict, int]:
         # 建立現有期別集合以供快速查重
         existing_periods = set(draw.get('period', '') for draw in merged[game_name])
         
-        # 只加入不重複的新資料
-        added_count = 0
+        # 新資料已全部存在（重複執行時的常見情況）則直接略過
+        if existing_periods.issuperset(draw.get('period', '') for draw in new_draws):
+            continue
+        
+        # 只保留不重複的新資料
+        fresh = []
         for draw in new_draws:
-            if draw.get('period', '') not in existing_periods:
-                merged[game_name].append(draw)
-                existing_periods.add(draw.get('period', ''))
-                added_count += 1
+            period = draw.get('period', '')
+            if period not in existing_periods:
+                fresh.append(draw)
+                existing_periods.add(period)
         
+        added_count = len(fresh)
         if added_count:
-            # 按日期重新排序（舊到新）
-            merged[game_name].sort(key=lambda x: x['date'])
+            # 現有資料已按日期排序，新資料排序後以單次線性合併取代整體重排（舊到新）
+            by_date = itemgetter('date')
+            fresh.sort(key=by_date)
+            merged[game_name] = list(heapq.merge(merged[game_name], fresh, key=by_date))
             total_added += added_count
             log(f"遊戲 {game_name} 合併 {added_count} 筆新資料", "SUCCESS")
     
     return merged, total_added
 
+def save_update_info(data: Dict, record_counts: Optional[Dict[str, int]] = None) -> Optional[Dict]:
+    """
+    只寫入 update-info.json（更新時間與筆數統計），返回寫入的內容，失敗時返回None
+    record_counts 為各遊戲筆數，呼叫端已計算過時可直接傳入
+    """
+    try:
+        os.makedirs('../data', exist_ok=True)
+        
+        if record_counts is None:
+            record_counts = {game_name: len(draws) for game_name, draws in data.items()}
+        
+        update_info = {
+            'last_updated': datetime.now(TAIPEI_TZ).isoformat(),
+            'data_version': '2.1',
+            'total_games': len(record_counts),
+            'total_records': sum(record_counts.values()),
+            'games_available': list(data.keys()),
+            'note': '資料來源: 台灣彩券官方ZIP檔案 + API'
+        }
+        
+        with open('../data/update-info.json', 'wb') as f:
+            f.write(dumps_json(update_info))
+        
+        return update_info
+        
+    except Exception as e:
+        log(f"儲存更新資訊失敗: {e}", "ERROR")
+        return None
+
 def save_data(data: Dict) -> bool:
     """儲存資料到檔案系統"""
     try:
         os.makedirs('../data', exist_ok=True)
         
-        # 建立備份
+        data_file = '../data/lottery-data.json'
         backup_file = '../data/lottery-data-backup.json'
-        if os.path.exists('../data/lottery-data.json'):
+        
+        # 先將新資料完整寫入暫存檔（完整編碼後一次寫入，避免逐元素的小量 write()）
+        tmp_file = data_file + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            f.write(dumps_json(data))
+            # 確保內容已落盤後才改名，避免當機時換上不完整的檔案
+            f.flush()
+            os.fsync(f.fileno())
+        
+        # 建立備份：以硬連結指向舊檔（不複製內容，也不移走主要檔案），
+        # 主要資料檔案在整個過程中始終存在
+        if os.path.exists(data_file):
             try:
-                shutil.copy2('../data/lottery-data.json', backup_file)
+                try:
+                    os.unlink(backup_file)
+                except FileNotFoundError:
+                    pass
+                try:
+                    os.link(data_file, backup_file)
+                except OSError:
+                    # 檔案系統不支援硬連結時改為複製
+                    shutil.copy2(data_file, backup_file)
                 log(f"建立備份: {backup_file}", "INFO")
             except Exception as e:
                 log(f"建立備份失敗: {e}", "WARNING")
         
-        # 儲存主要資料檔案
-        with open('../data/lottery-data.json', 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        # 以原子性改名換上新的主要資料檔案
+        os.replace(tmp_file, data_file)
         
-        # 儲存更新資訊
-        update_info = {
-            'last_updated': datetime.now(TAIPEI_TZ).isoformat(),
-            'data_version': '2.1',
-            'total_games': len(data),
-            'total_records': sum(len(records) for records in data.values()),
-            'games_available': list(data.keys()),
-            'note': '資料來源: 台灣彩券官方ZIP檔案 + API'
-        }
+        # 各遊戲筆數只計算一次，供更新資訊與摘要共用
+        record_counts = {game_name: len(draws) for game_name, draws in data.items()}
         
-        with open('../data/update-info.json', 'w', encoding='utf-8') as f:
-            json.dump(update_info, f, ensure_ascii=False, indent=2)
+        # 儲存更新資訊
+        update_info = save_update_info(data, record_counts)
+        if update_info is None:
+            return False
         
         # 顯示摘要
         log("=" * 60, "INFO")
@@ -150,21 +272,18 @@ def save_data(data: Dict) -> bool:
         log("=" * 60, "INFO")
         
         for game_name, draws in data.items():
-            if draws:
-                # 顯示最早和最晚日期
-                earliest = draws[0]['date']
-                latest = draws[-1]['date']
-                log(f"  {game_name}: {len(draws)} 筆", "INFO")
-                log(f"    時間範圍: {earliest} 到 {latest}", "INFO")
-                
-                # 顯示最新一期
-                latest_draw = draws[-1]
-                numbers_str = str(latest_draw['numbers'])
-                if 'special' in latest_draw:
-                    numbers_str += f" 特別號: {latest_draw['special']}"
-                log(f"    最新一期: {latest_draw['date']} {numbers_str}", "INFO")
-            else:
+            if not draws:
                 log(f"  {game_name}: 0 筆", "INFO")
+                continue
+            
+            # 顯示最早和最晚日期
+            earliest_draw, latest_draw = draws[0], draws[-1]
+            log(f"  {game_name}: {record_counts[game_name]} 筆", "INFO")
+            log(f"    時間範圍: {earliest_draw['date']} 到 {latest_draw['date']}", "INFO")
+            
+            # 顯示最新一期
+            special_str = f" 特別號: {latest_draw['special']}" if 'special' in latest_draw else ""
+            log(f"    最新一期: {latest_draw['date']} {latest_draw['numbers']}{special_str}", "INFO")
         
         log(f"總計: {update_info['total_records']} 筆開獎紀錄", "SUCCESS")
         log(f"更新時間: {update_info['last_updated'][:19]}", "INFO")
@@ -189,18 +308,12 @@ def check_data_coverage(data: Dict) -> None:
             log(f"{game_name}: 無資料", "WARNING")
             continue
         
-        earliest_date = datetime.strptime(draws[0]['date'], '%Y-%m-%d')
-        latest_date = datetime.strptime(draws[-1]['date'], '%Y-%m-%d')
-        
         log(f"{game_name}:", "INFO")
         log(f"  資料範圍: {draws[0]['date']} 到 {draws[-1]['date']}", "INFO")
         log(f"  總期數: {len(draws)}", "INFO")
         
-        # 檢查年份覆蓋
-        years = set()
-        for draw in draws:
-            year = datetime.strptime(draw['date'], '%Y-%m-%d').year
-            years.add(year)
+        # 檢查年份覆蓋（日期固定為 YYYY-MM-DD，直接取前4碼，免逐筆 strptime）
+        years = {int(year) for year in {draw['date'][:4] for draw in draws}}
         
         if years:
             sorted_years = sorted(years)
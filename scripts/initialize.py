@@ -16,13 +16,46 @@ from common import (
 )
 import zipfile
 import csv
+import codecs
+import io
+import itertools
+import traceback
+from operator import itemgetter
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 import re
 
-def extract_zip_file(zip_path: str, extract_to: str) -> List[str]:
-    """解壓縮ZIP檔案，返回解壓縮的檔案列表"""
-    extracted_files = []
+# CSV中支援匯入的遊戲名稱
+SUPPORTED_CSV_GAMES = frozenset(["大樂透", "威力彩", "今彩539", "3星彩"])
+
+# ZIP檔案名稱中的數字片段（用於偵測年份）
+ZIP_NUMBER_RE = re.compile(r'\d+')
+
+# CSV檔案名稱關鍵字對應遊戲（每個遊戲一個預編譯正規表示式，依序比對，先符合者優先）
+# 威力彩須排在大樂透之前：官方檔名 SuperLotto638 同時含有 "lotto"
+CSV_GAME_PATTERNS = (
+    ("威力彩", re.compile(r'威力彩|super|638', re.IGNORECASE)),
+    ("大樂透", re.compile(r'大樂透|lotto|649', re.IGNORECASE)),
+    ("今彩539", re.compile(r'今彩539|daily|539', re.IGNORECASE)),
+    ("3星彩", re.compile(r'3星')),
+)
+
+# CSV沒有BOM時依序嘗試的編碼（官方檔案多為 utf-8 或 big5）
+CSV_ENCODINGS = ('utf-8', 'big5', 'cp950')
+
+# CSV開獎日期可能的格式（依常見程度排序）
+CSV_DATE_FORMATS = (
+    "%Y/%m/%d", "%Y-%m-%d",
+    "%Y年%m月%d日", "%Y.%m.%d",
+    "%m/%d/%Y", "%d/%m/%Y"
+)
+
+# 同一字串可能同時符合的格式（如 01/02/2024），必須維持上面的固定順序
+CSV_AMBIGUOUS_DATE_FORMATS = frozenset(("%m/%d/%Y", "%d/%m/%Y"))
+
+def read_zip_csv_files(zip_path: str) -> List[Tuple[str, bytes]]:
+    """直接在記憶體中讀取ZIP檔案內的CSV，返回 (檔名, 原始內容) 列表，不寫入磁碟"""
+    csv_contents = []
     
     try:
         with zipfile.ZipFile(zip_path, 'r') as zip_ref:
@@ -36,18 +69,16 @@ def extract_zip_file(zip_path: str, extract_to: str) -> List[str]:
                 log(f"ZIP檔案中沒有CSV檔案: {zip_path}", "WARNING")
                 return []
             
-            # 解壓縮所有CSV檔案
+            # 讀取所有CSV檔案內容
             for csv_file in csv_files:
                 try:
-                    zip_ref.extract(csv_file, extract_to)
-                    extracted_path = os.path.join(extract_to, csv_file)
-                    extracted_files.append(extracted_path)
-                    log(f"解壓縮檔案: {csv_file}", "INFO")
+                    csv_contents.append((csv_file, zip_ref.read(csv_file)))
+                    log(f"讀取檔案: {csv_file}", "INFO")
                 except Exception as e:
-                    log(f"解壓縮失敗 {csv_file}: {e}", "WARNING")
+                    log(f"讀取失敗 {csv_file}: {e}", "WARNING")
             
-            log(f"成功解壓縮 {len(extracted_files)} 個CSV檔案", "SUCCESS")
-            return extracted_files
+            log(f"成功讀取 {len(csv_contents)} 個CSV檔案", "SUCCESS")
+            return csv_contents
             
     except zipfile.BadZipFile:
         log(f"ZIP檔案損壞: {zip_path}", "ERROR")
@@ -61,10 +92,10 @@ def find_zip_files(directory: str) -> List[str]:
     zip_files = []
     
     try:
-        for file in os.listdir(directory):
-            if file.lower().endswith('.zip'):
-                zip_path = os.path.join(directory, file)
-                zip_files.append(zip_path)
+        # scandir 的 DirEntry 已帶有檔名與類型資訊，不需另外組路徑或 stat
+        with os.scandir(directory) as entries:
+            zip_files = [entry.path for entry in entries
+                         if entry.name.lower().endswith('.zip') and entry.is_file()]
     except Exception as e:
         log(f"掃描目錄失敗: {e}", "ERROR")
     
@@ -75,231 +106,230 @@ def detect_year_from_zip_filename(filename: str) -> Optional[int]:
     # 移除副檔名和路徑
     basename = os.path.basename(filename).replace('.zip', '').replace('.ZIP', '')
     
-    # 嘗試解析數字
-    try:
-        # 嘗試直接轉整數
-        year = int(basename)
+    # 依序檢查檔名中的每段數字（純數字檔名即為單一一段）
+    for number in ZIP_NUMBER_RE.findall(basename):
+        year = int(number)
         
         # 檢查是否為西元年
         if 2000 <= year <= 2100:
             return year
         
-        # 檢查是否為民國年（需要轉換）
+        # 檢查是否為民國年（需要轉換），不在對照表中時使用公式計算
         if 100 <= year <= 200:  # 民國100年-200年
-            roc_year = year
-            if roc_year in ROCN_YEAR_MAP:
-                return ROCN_YEAR_MAP[roc_year]
-            
-            # 如果不在對照表中，使用公式計算
-            return roc_year + 1911
-            
-    except ValueError:
-        # 嘗試從字串中提取數字
-        numbers = re.findall(r'\d+', basename)
-        if numbers:
-            try:
-                year = int(numbers[0])
-                if len(numbers[0]) == 4:  # 4位數，假設是西元年
-                    if 2000 <= year <= 2100:
-                        return year
-                elif len(numbers[0]) == 3:  # 3位數，假設是民國年
-                    roc_year = year
-                    if roc_year in ROCN_YEAR_MAP:
-                        return ROCN_YEAR_MAP[roc_year]
-                    return roc_year + 1911
-            except:
-                pass
+            return ROCN_YEAR_MAP.get(year, year + 1911)
     
     log(f"無法從檔案名稱檢測年份: {filename}", "WARNING")
     return None
 
-def parse_taiwan_lottery_csv(csv_path: str, default_year: Optional[int] = None) -> List[Dict]:
+def detect_game_from_csv_filename(csv_filename: str) -> Optional[str]:
+    """從CSV檔案名稱判斷遊戲類型，無法識別時返回None"""
+    for game_name, pattern in CSV_GAME_PATTERNS:
+        if pattern.search(csv_filename):
+            return game_name
+    return None
+
+def parse_number_cells(cells: List[str], min_num: int, max_num: int) -> List[int]:
+    """解析一段號碼欄位，略過空白、非數字及超出範圍的值"""
+    numbers = []
+    for cell in cells:
+        cell = cell.strip()
+        # 先檢查是否為數字，正常資料不需進入例外處理
+        if cell.isdecimal():
+            num = int(cell)
+            if min_num <= num <= max_num:
+                numbers.append(num)
+    return numbers
+
+def fast_parse_csv_date(date_str: str) -> Optional[datetime]:
+    """快速解析固定寬度的 YYYY/MM/DD 或 YYYY-MM-DD 日期，不符合時返回None"""
+    if len(date_str) != 10 or date_str[4] not in '/-' or date_str[7] != date_str[4]:
+        return None
+    
+    year, month, day = date_str[:4], date_str[5:7], date_str[8:]
+    if not (year.isdigit() and month.isdigit() and day.isdigit()):
+        return None
+    
+    try:
+        return datetime(int(year), int(month), int(day))
+    except ValueError:
+        return None
+
+def decode_csv_bytes(raw: bytes) -> Optional[str]:
+    """偵測CSV編碼並解碼：有UTF-8 BOM直接使用 utf-8-sig，否則依 CSV_ENCODINGS 順序嘗試"""
+    if raw.startswith(codecs.BOM_UTF8):
+        try:
+            return raw.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            return None
+    
+    for encoding in CSV_ENCODINGS:
+        try:
+            return raw.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    
+    return None
+
+def parse_taiwan_lottery_csv(raw: bytes, csv_path: str, default_year: Optional[int] = None) -> List[Dict]:
     """
-    解析台灣彩券官方CSV格式
+    解析台灣彩券官方CSV格式（raw 為CSV原始位元組，csv_path 僅用於日誌）
     格式: 遊戲名稱,期別,開獎日期,銷售總額,銷售注數,總獎金,獎號1,獎號2,獎號3,獎號4,獎號5,獎號6,特別號
     """
     draws = []
     
+    # 依BOM與候選編碼只解碼一次，不再對整個檔案反覆重試
+    text = decode_csv_bytes(raw)
+    if text is None:
+        log(f"無法辨識CSV編碼: {csv_path}", "ERROR")
+        return []
+    
     try:
-        # 嘗試不同編碼
-        encodings = ['utf-8', 'utf-8-sig', 'big5', 'cp950']
-        
-        for encoding in encodings:
-            try:
-                with open(csv_path, 'r', encoding=encoding) as f:
-                    # 讀取CSV
-                    reader = csv.reader(f)
-                    rows = list(reader)
+        with io.StringIO(text) as f:
+            # 逐行讀取CSV（不將所有行一次載入記憶體）
+            reader = csv.reader(f)
+            first_row = next(reader, None)
+            
+            if first_row is None:
+                log(f"CSV檔案為空: {csv_path}", "WARNING")
+                return []
+            
+            # 檢查檔案格式
+            if len(first_row) < 10:
+                log(f"CSV格式不符合預期: {csv_path}", "WARNING")
+                return []
+            
+            # 處理每一行（首行只檢查一次是否為標頭）
+            if "遊戲名稱" in first_row[0] or "期別" in first_row[1]:
+                start_row = 1  # 跳過標頭行
+                rows = reader
+            else:
+                start_row = 0
+                rows = itertools.chain([first_row], reader)
+            
+            # 同一檔案的日期格式通常一致：記住上次成功的格式，之後優先嘗試
+            date_formats = CSV_DATE_FORMATS
+            
+            # 有問題的資料只計數並保留少量範例，最後各彙總成一筆警告
+            bad_date_count = 0
+            bad_date_samples = []
+            bad_number_count = 0
+            bad_number_samples = []
+            failed_row_count = 0
+            failed_row_samples = []
+            
+            for i, row in enumerate(rows, start=start_row):
+                try:
+                    if len(row) < 7:  # 至少要有遊戲名稱、期別、日期和幾個號碼
+                        continue
                     
-                    if not rows:
-                        log(f"CSV檔案為空: {csv_path}", "WARNING")
-                        return []
+                    # 解析遊戲名稱
+                    game_name = row[0].strip()
                     
-                    # 檢查檔案格式
-                    if len(rows[0]) < 10:
-                        log(f"CSV格式不符合預期: {csv_path}", "WARNING")
-                        return []
+                    # 只處理我們支援的遊戲
+                    if game_name not in SUPPORTED_CSV_GAMES:
+                        continue
                     
-                    # 處理每一行（跳過可能的標頭）
-                    start_row = 0
-                    if "遊戲名稱" in rows[0][0] or "期別" in rows[0][1]:
-                        start_row = 1  # 跳過標頭行
+                    # 解析期別
+                    period = row[1].strip()
                     
-                    for i in range(start_row, len(rows)):
-                        try:
-                            row = rows[i]
-                            if len(row) < 7:  # 至少要有遊戲名稱、期別、日期和幾個號碼
-                                continue
-                            
-                            # 解析遊戲名稱
-                            game_name = row[0].strip()
-                            
-                            # 只處理我們支援的遊戲
-                            if game_name not in ["大樂透", "威力彩", "今彩539", "3星彩"]:
-                                continue
-                            
-                            # 解析期別
-                            period = row[1].strip()
-                            
-                            # 解析開獎日期
-                            date_str = row[2].strip()
-                            
-                            # 日期格式處理
-                            try:
-                                # 嘗試解析日期
-                                date_formats = [
-                                    "%Y/%m/%d", "%Y-%m-%d", 
-                                    "%Y年%m月%d日", "%Y.%m.%d",
-                                    "%m/%d/%Y", "%d/%m/%Y"
-                                ]
-                                
-                                parsed_date = None
-                                for fmt in date_formats:
-                                    try:
-                                        parsed_date = datetime.strptime(date_str, fmt)
-                                        break
-                                    except ValueError:
-                                        continue
-                                
-                                if not parsed_date and default_year:
-                                    # 如果無法解析日期，使用預設年份
-                                    try:
-                                        # 嘗試解析月日
-                                        month_day = date_str.replace('月', '/').replace('日', '')
-                                        parsed_date = datetime.strptime(f"{default_year}/{month_day}", "%Y/%m/%d")
-                                    except:
-                                        pass
-                                
-                                if not parsed_date:
-                                    log(f"無法解析日期: {date_str}，跳過此筆", "WARNING")
+                    # 解析開獎日期
+                    date_str = row[2].strip()
+                    
+                    # 日期格式處理
+                    try:
+                        # 嘗試解析日期（先走固定寬度快速路徑）
+                        parsed_date = fast_parse_csv_date(date_str)
+                        if not parsed_date:
+                            for fmt in date_formats:
+                                try:
+                                    parsed_date = datetime.strptime(date_str, fmt)
+                                    break
+                                except ValueError:
                                     continue
-                                
-                                formatted_date = parsed_date.strftime("%Y-%m-%d")
-                                
-                            except Exception as e:
-                                log(f"日期解析失敗 {date_str}: {e}", "WARNING")
-                                continue
-                            
-                            # 解析開獎號碼
-                            numbers = []
-                            special = None
-                            
-                            if game_name == "大樂透":
-                                # 大樂透: 6個普通號 + 1個特別號
-                                for col_idx in range(6, 12):  # 獎號1-6
-                                    if col_idx < len(row) and row[col_idx].strip():
-                                        try:
-                                            num = int(row[col_idx].strip())
-                                            if 1 <= num <= 49:
-                                                numbers.append(num)
-                                        except:
-                                            pass
-                                
-                                # 特別號
-                                if len(row) > 12 and row[12].strip():
-                                    try:
-                                        special = int(row[12].strip())
-                                    except:
-                                        pass
-                            
-                            elif game_name == "威力彩":
-                                # 威力彩: 6個普通號 + 1個特別號
-                                for col_idx in range(6, 12):  # 獎號1-6
-                                    if col_idx < len(row) and row[col_idx].strip():
-                                        try:
-                                            num = int(row[col_idx].strip())
-                                            if 1 <= num <= 38:
-                                                numbers.append(num)
-                                        except:
-                                            pass
-                                
-                                # 特別號
-                                if len(row) > 12 and row[12].strip():
-                                    try:
-                                        special = int(row[12].strip())
-                                    except:
-                                        pass
-                            
-                            elif game_name == "今彩539":
-                                # 今彩539: 5個普通號，無特別號
-                                for col_idx in range(6, 11):  # 獎號1-5
-                                    if col_idx < len(row) and row[col_idx].strip():
-                                        try:
-                                            num = int(row[col_idx].strip())
-                                            if 1 <= num <= 39:
-                                                numbers.append(num)
-                                        except:
-                                            pass
-                            
-                            elif game_name == "3星彩":
-                                # 3星彩: 3個普通號
-                                for col_idx in range(6, 9):  # 獎號1-3
-                                    if col_idx < len(row) and row[col_idx].strip():
-                                        try:
-                                            num = int(row[col_idx].strip())
-                                            if 0 <= num <= 9:
-                                                numbers.append(num)
-                                        except:
-                                        pass
                             
-                            # 檢查號碼數量
-                            expected_count = GAME_API_CONFIG.get(game_name, {}).get("number_count", 0)
-                            if expected_count > 0 and len(numbers) != expected_count:
-                                log(f"{game_name} 號碼數量不正確 {len(numbers)}/{expected_count}: {formatted_date}", "WARNING")
-                                continue
-                            
-                            # 排序號碼（除了3星彩，因為3星彩是有順序的）
-                            if game_name != "3星彩":
-                                numbers.sort()
-                            
-                            # 建立標準格式
-                            draw_data = {
-                                "date": formatted_date,
-                                "period": period,
-                                "numbers": numbers
-                            }
-                            
-                            if special is not None:
-                                draw_data["special"] = special
-                            
-                            draws.append(draw_data)
-                            
-                        except Exception as e:
-                            log(f"解析第{i+1}行失敗: {e}", "WARNING")
+                            # 月/日順序有歧義的格式不提前，確保 01/02/2024 永遠以 %m/%d/%Y 優先解析
+                            if (parsed_date and fmt != date_formats[0]
+                                    and fmt not in CSV_AMBIGUOUS_DATE_FORMATS):
+                                date_formats = (fmt,) + tuple(f for f in CSV_DATE_FORMATS if f != fmt)
+                        
+                        if not parsed_date and default_year:
+                            # 如果無法解析日期，使用預設年份
+                            try:
+                                # 嘗試解析月日
+                                month_day = date_str.replace('月', '/').replace('日', '')
+                                parsed_date = datetime.strptime(f"{default_year}/{month_day}", "%Y/%m/%d")
+                            except:
+                                pass
+                        
+                        if not parsed_date:
+                            bad_date_count += 1
+                            if len(bad_date_samples) < 3:
+                                bad_date_samples.append(date_str)
                             continue
+                        
+                        formatted_date = parsed_date.strftime("%Y-%m-%d")
+                        
+                    except Exception:
+                        bad_date_count += 1
+                        if len(bad_date_samples) < 3:
+                            bad_date_samples.append(date_str)
+                        continue
                     
-                    # 成功讀取，跳出編碼迴圈
-                    break
+                    # 解析開獎號碼（欄位位置與號碼範圍見 GAME_API_CONFIG）
+                    game_config = GAME_API_CONFIG[game_name]
+                    first_col, end_col = game_config.csv_number_cols
+                    numbers = parse_number_cells(row[first_col:end_col], *game_config.number_range)
                     
-            except UnicodeDecodeError:
-                continue  # 嘗試下一個編碼
-            except Exception as e:
-                log(f"讀取CSV失敗 {csv_path}: {e}", "ERROR")
-                return []
+                    # 特別號
+                    special = None
+                    special_col = game_config.csv_special_col
+                    if special_col is not None and len(row) > special_col:
+                        special_cell = row[special_col].strip()
+                        if special_cell:
+                            try:
+                                special = int(special_cell)
+                            except:
+                                pass
+                    
+                    # 檢查號碼數量
+                    expected_count = game_config.number_count
+                    if expected_count > 0 and len(numbers) != expected_count:
+                        bad_number_count += 1
+                        if len(bad_number_samples) < 3:
+                            bad_number_samples.append(f"{game_name} {formatted_date} {len(numbers)}/{expected_count}")
+                        continue
+                    
+                    # 排序號碼（3星彩是有順序的，不排序）
+                    if game_config.sort_numbers:
+                        numbers.sort()
+                    
+                    # 建立標準格式
+                    draw_data = {
+                        "date": formatted_date,
+                        "period": period,
+                        "numbers": numbers
+                    }
+                    
+                    if special is not None:
+                        draw_data["special"] = special
+                    
+                    draws.append(draw_data)
+                    
+                except Exception as e:
+                    failed_row_count += 1
+                    if len(failed_row_samples) < 3:
+                        failed_row_samples.append(f"第{i+1}行: {e}")
+                    continue
+            
+            if bad_date_count:
+                log(f"{bad_date_count} 筆資料無法解析日期已跳過 {csv_path}，例如: {bad_date_samples}", "WARNING")
+            if bad_number_count:
+                log(f"{bad_number_count} 筆資料號碼數量不正確已跳過 {csv_path}，例如: {bad_number_samples}", "WARNING")
+            if failed_row_count:
+                log(f"{failed_row_count} 行解析失敗已跳過 {csv_path}，例如: {failed_row_samples}", "WARNING")
         
         if draws:
-            # 按日期排序（從舊到新）
-            draws.sort(key=lambda x: x['date'])
+            # 不在此排序：batch_process_zip_files 會在去重後對每個遊戲統一排序一次
             log(f"成功解析 {len(draws)} 筆開獎資料: {csv_path}", "SUCCESS")
         
         return draws
@@ -308,6 +338,48 @@ def parse_taiwan_lottery_csv(csv_path: str, default_year: Optional[int] = None)
         log(f"處理CSV檔案失敗 {csv_path}: {e}", "ERROR")
         return []
 
+def process_zip_file(zip_path: str) -> List[Tuple[str, List[Dict]]]:
+    """
+    處理單一ZIP檔案，返回 (遊戲名稱, 開獎資料) 列表（依CSV順序）
+    """
+    zip_filename = os.path.basename(zip_path)
+    log(f"處理ZIP檔案: {zip_filename}", "ZIP")
+    
+    results = []
+    
+    # 從檔案名稱檢測年份
+    default_year = detect_year_from_zip_filename(zip_filename)
+    if default_year:
+        log(f"檢測到年份: {default_year}", "INFO")
+    
+    # 直接從ZIP讀取CSV內容（不解壓縮到磁碟）
+    csv_contents = read_zip_csv_files(zip_path)
+    
+    if not csv_contents:
+        log(f"ZIP檔案讀取失敗或沒有CSV檔案: {zip_filename}", "WARNING")
+        return results
+    
+    # 處理每個CSV檔案
+    for csv_path, raw in csv_contents:
+        csv_filename = os.path.basename(csv_path)
+        
+        # 解析CSV檔案
+        draws = parse_taiwan_lottery_csv(raw, csv_path, default_year)
+        
+        if draws:
+            # 從CSV檔案名稱判斷遊戲類型（每個檔案只判斷一次）
+            game_name = detect_game_from_csv_filename(csv_filename)
+            
+            # 將資料歸入對應遊戲
+            if game_name and game_name in GAME_API_CONFIG:
+                results.append((game_name, draws))
+            else:
+                log(f"無法識別遊戲類型或遊戲未支援: {csv_filename}", "WARNING")
+    
+    log(f"完成處理 {zip_filename}", "SUCCESS")
+    
+    return results
+
 def batch_process_zip_files(zip_dir: str = "../zip_files") -> Dict:
     """
     批次處理ZIP檔案目錄中的所有ZIP檔案
@@ -315,10 +387,6 @@ def batch_process_zip_files(zip_dir: str = "../zip_files") -> Dict:
     """
     log(f"開始批次處理ZIP檔案目錄: {zip_dir}", "ZIP")
     
-    # 建立暫存目錄
-    temp_dir = "temp_extract"
-    os.makedirs(temp_dir, exist_ok=True)
-    
     # 最終資料庫
     all_data = {game: [] for game in GAME_API_CONFIG.keys()}
     
@@ -333,83 +401,27 @@ def batch_process_zip_files(zip_dir: str = "../zip_files") -> Dict:
     
     log(f"找到 {len(zip_files)} 個ZIP檔案", "INFO")
     
-    # 處理每個ZIP檔案
-    for zip_path in zip_files:
-        zip_filename = os.path.basename(zip_path)
-        log(f"處理ZIP檔案: {zip_filename}", "ZIP")
-        
-        # 從檔案名稱檢測年份
-        default_year = detect_year_from_zip_filename(zip_filename)
-        if default_year:
-            log(f"檢測到年份: {default_year}", "INFO")
-        
-        # 解壓縮ZIP檔案
-        extracted_files = extract_zip_file(zip_path, temp_dir)
-        
-        if not extracted_files:
-            log(f"ZIP檔案解壓縮失敗或沒有CSV檔案: {zip_filename}", "WARNING")
-            continue
-        
-        # 處理每個CSV檔案
-        for csv_path in extracted_files:
-            csv_filename = os.path.basename(csv_path)
-            
-            # 解析CSV檔案
-            draws = parse_taiwan_lottery_csv(csv_path, default_year)
-            
-            if draws:
-                # 將資料按遊戲分類
-                for draw in draws:
-                    # 從CSV檔案名稱判斷遊戲類型
-                    csv_lower = csv_filename.lower()
-                    if "大樂透" in csv_lower or "lotto" in csv_lower or "649" in csv_lower:
-                        game_name = "大樂透"
-                    elif "威力彩" in csv_lower or "super" in csv_lower or "638" in csv_lower:
-                        game_name = "威力彩"
-                    elif "今彩539" in csv_lower or "daily" in csv_lower or "539" in csv_lower:
-                        game_name = "今彩539"
-                    elif "3星彩" in csv_lower or "3星" in csv_lower:
-                        game_name = "3星彩"
-                    else:
-                        # 嘗試從資料中的遊戲名稱判斷
-                        continue
-                    
-                    if game_name and game_name in all_data:
-                        all_data[game_name].append(draw)
-                    else:
-                        log(f"無法識別遊戲類型或遊戲未支援: {csv_filename}", "WARNING")
-            
-            # 刪除暫存CSV檔案
-            try:
-                os.remove(csv_path)
-            except:
-                pass
-        
-        log(f"完成處理 {zip_filename}", "SUCCESS")
+    # 匯入時直接以期別為鍵去重（較晚匯入的資料覆蓋較早的）
+    draws_by_period = {game: {} for game in all_data}
     
-    # 清理暫存目錄
-    try:
-        os.rmdir(temp_dir)
-    except:
-        pass
-    
-    # 對每個遊戲的資料進行去重和排序
-    for game_name, draws in all_data.items():
-        if draws:
-            # 去重（基於期別）
-            unique_draws = {}
+    # 依序處理每個ZIP檔案（較晚處理的資料覆蓋較早的）
+    for zip_path in zip_files:
+        for game_name, draws in process_zip_file(zip_path):
+            game_draws = draws_by_period[game_name]
             for draw in draws:
                 period = draw.get("period", "")
                 if period:
-                    unique_draws[period] = draw
-            
-            # 轉回列表並按日期排序
-            all_data[game_name] = list(unique_draws.values())
-            all_data[game_name].sort(key=lambda x: x['date'])
+                    game_draws[period] = draw
+    
+    # 對每個遊戲的唯一資料按日期排序，並順便累計總筆數
+    total_records = 0
+    for game_name, game_draws in draws_by_period.items():
+        if game_draws:
+            all_data[game_name] = sorted(game_draws.values(), key=itemgetter('date'))
+            total_records += len(game_draws)
             
-            log(f"{game_name}: {len(all_data[game_name])} 筆唯一資料", "SUCCESS")
+            log(f"{game_name}: {len(game_draws)} 筆唯一資料", "SUCCESS")
     
-    total_records = sum(len(draws) for draws in all_data.values())
     log(f"批次處理完成！總共 {total_records} 筆開獎資料", "SUCCESS")
     
     return all_data
@@ -476,8 +488,8 @@ def main():
         log("程式被使用者中斷", "WARNING")
     except Exception as e:
         log(f"程式執行發生未預期錯誤: {e}", "ERROR")
-        import traceback
-        traceback.print_exc()
+        # 完整追蹤訊息以單次寫入輸出到 stderr
+        sys.stderr.write(traceback.format_exc())
     
     print("=" * 70)
     return success
@@ -9,12 +9,17 @@ import requests
 import os
 import sys
 import time
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from common import (
     log, load_existing_data, merge_and_deduplicate, 
-    save_data, check_data_coverage, GAME_API_CONFIG,
-    TAIPEI_TZ
+    save_data, save_update_info, check_data_coverage, GAME_API_CONFIG,
+    GameConfig, TAIPEI_TZ, parse_ymd
 )
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
@@ -31,45 +36,113 @@ REQUEST_HEADERS = {
     'Referer': 'https://www.taiwanlottery.com/',
 }
 
+# 同時抓取月份資料的執行緒數量（同時也是對伺服器的並行上限）
+MAX_FETCH_WORKERS = 4
+
+# 任兩次請求開始之間的最短間隔秒數（所有執行緒共用），避免請求過於頻繁；
+# 0.25 秒即每秒最多 4 次，與過去 4 個執行緒各自每請求後等待 1 秒的上限相同
+REQUEST_INTERVAL = 0.25
+
+# 暫時性錯誤（限流、伺服器錯誤、連線失敗）的重試策略，交由 urllib3 處理退避並遵守 Retry-After；
+# 400/403 等永久性錯誤不重試
+RETRY_POLICY = Retry(
+    total=3,
+    backoff_factor=1,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset(["GET"]),
+    respect_retry_after_header=True,
+    raise_on_status=False
+)
+
+# 每個執行緒各自持有連線（requests.Session 不保證執行緒安全），
+# 同一執行緒的請求仍重複使用 TCP/TLS 連線（HTTP keep-alive）
+_thread_local = threading.local()
+
 # ========== API相關函數 ==========
-def safe_api_request(url: str, params: Dict, max_retries: int = 3) -> Optional[Dict]:
-    """安全的API請求函數，包含重試機制"""
-    for attempt in range(max_retries):
-        try:
-            response = requests.get(url, headers=REQUEST_HEADERS, params=params, timeout=15)
-            
-            if response.status_code == 200:
-                return response.json()
-            elif response.status_code == 404:
-                log(f"API資源不存在: {url}", "WARNING")
-                return None
-            else:
-                log(f"API請求失敗 (狀態碼 {response.status_code})，第 {attempt+1} 次重試", "WARNING")
-                
-        except requests.exceptions.RequestException as e:
-            log(f"網路請求異常: {e}，第 {attempt+1} 次重試", "WARNING")
+class RequestPacer:
+    """請求節流器：讓任兩次請求的開始時間至少相隔 min_interval 秒（執行緒安全）
+    
+    只在距離上次請求不足間隔時才等待，回應本身較慢時不再額外空等
+    """
+    
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+    
+    def wait(self) -> None:
+        """預約下一個可用時段，必要時睡到該時段為止"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.min_interval
         
-        if attempt < max_retries - 1:
-            time.sleep(2 ** attempt)
+        if slot > now:
+            time.sleep(slot - now)
+
+REQUEST_PACER = RequestPacer(REQUEST_INTERVAL)
+
+def get_session() -> requests.Session:
+    """取得目前執行緒專用的 requests.Session，第一次使用時建立"""
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.headers.update(REQUEST_HEADERS)
+        adapter = HTTPAdapter(max_retries=RETRY_POLICY)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _thread_local.session = session
+    return session
+
+def safe_api_request(url: str, params: Dict) -> Optional[Dict]:
+    """安全的API請求函數，暫時性錯誤的重試由 Session 上的 RETRY_POLICY 處理"""
+    REQUEST_PACER.wait()
+    
+    try:
+        response = get_session().get(url, params=params, timeout=15)
+        
+        if response.status_code == 200:
+            return response.json()
+        elif response.status_code == 404:
+            log(f"API資源不存在: {url}", "WARNING")
+            return None
+        else:
+            log(f"API請求失敗 (狀態碼 {response.status_code})", "WARNING")
+            
+    except (requests.exceptions.RequestException, ValueError) as e:
+        log(f"網路請求異常: {e}", "WARNING")
     
     log(f"API請求最終失敗: {url}", "ERROR")
     return None
 
-def parse_draw_numbers(raw_data: Dict, game_config: Dict) -> Optional[Dict]:
+def parse_api_date(lottery_date: str) -> Optional[str]:
+    """取出API lotteryDate（ISO 8601，例如 2025-10-02T00:00:00）的 YYYY-MM-DD 部分，格式不符時返回None
+    
+    日期部分直接切片即可，不需建立 datetime 再 strftime（時區後綴不影響日期部分）
+    """
+    date_part = lottery_date[:10]
+    if (len(date_part) == 10 and date_part[4] == '-' and date_part[7] == '-'
+            and date_part[:4].isdigit() and date_part[5:7].isdigit() and date_part[8:].isdigit()):
+        return date_part
+    return None
+
+def parse_draw_numbers(raw_data: Dict, game_config: GameConfig) -> Optional[Dict]:
     """從API原始資料解析開獎號碼"""
     try:
         # 提取開獎號碼陣列
         draw_numbers = raw_data.get("drawNumberSize", [])
-        if not draw_numbers or len(draw_numbers) < game_config["number_count"]:
+        number_count = game_config.number_count
+        if not draw_numbers or len(draw_numbers) < number_count:
             return None
         
-        # 提取普通號碼
-        normal_numbers = draw_numbers[:game_config["number_count"]]
+        # 提取普通號碼（切片已是新列表，直接就地排序）
+        normal_numbers = draw_numbers[:number_count]
+        normal_numbers.sort()
         
         # 提取特別號
         special_number = None
-        if game_config["has_special"] and len(draw_numbers) > game_config["number_count"]:
-            special_number = draw_numbers[game_config["number_count"]]
+        if game_config.has_special and len(draw_numbers) > number_count:
+            special_number = draw_numbers[number_count]
         
         # 解析開獎日期
         lottery_date = raw_data.get("lotteryDate", "")
@@ -77,17 +150,15 @@ def parse_draw_numbers(raw_data: Dict, game_config: Dict) -> Optional[Dict]:
             return None
         
         # 轉換日期格式
-        try:
-            date_obj = datetime.fromisoformat(lottery_date.replace('Z', '+00:00'))
-            formatted_date = date_obj.strftime('%Y-%m-%d')
-        except ValueError:
+        formatted_date = parse_api_date(lottery_date)
+        if not formatted_date:
             return None
         
         # 建構標準化資料
         result = {
             "date": formatted_date,
             "period": raw_data.get("period", ""),
-            "numbers": sorted(normal_numbers)
+            "numbers": normal_numbers
         }
         
         if special_number is not None:
@@ -108,11 +179,11 @@ def fetch_game_month_data(game_name: str, year: int, month: int) -> List[Dict]:
     config = GAME_API_CONFIG[game_name]
     
     # 檢查是否有API端點
-    if not config.get("api_path"):
+    if not config.api_path:
         log(f"遊戲 '{game_name}' 沒有API端點", "INFO")
         return []
     
-    api_url = f"{API_BASE_URL}{config['api_path']}"
+    api_url = f"{API_BASE_URL}{config.api_path}"
     
     params = {
         'month': f"{year}-{month:02d}",
@@ -162,47 +233,51 @@ def fetch_game_month_data(game_name: str, year: int, month: int) -> List[Dict]:
         log(f"解析API回應時發生錯誤: {e}", "ERROR")
         return []
 
+def fetch_game_months(game_name: str, months: List[Tuple[int, int]],
+                      executor: Optional[ThreadPoolExecutor] = None) -> List[List[Dict]]:
+    """以執行緒池並行抓取多個月份的開獎資料，結果依輸入月份順序返回
+
+    傳入 executor 時與其他遊戲共用同一個執行緒池，總併發數仍受 MAX_FETCH_WORKERS 限制
+    """
+    # 請求頻率由 safe_api_request 中的 REQUEST_PACER 控制，這裡不需再等待
+    def fetch_one(year_month: Tuple[int, int]) -> List[Dict]:
+        return fetch_game_month_data(game_name, *year_month)
+    
+    if executor is not None:
+        return list(executor.map(fetch_one, months))
+    
+    with ThreadPoolExecutor(max_workers=MAX_FETCH_WORKERS) as executor:
+        return list(executor.map(fetch_one, months))
+
 def get_months_to_fetch(latest_date: datetime) -> List[Tuple[int, int]]:
     """
     計算需要抓取的月份清單
     從本地最新日期的「下一個月」開始，到「當前月份」為止
     """
     today = datetime.now(TAIPEI_TZ)
-    months_needed = []
     
+    # 以整數月份索引（年*12 + 月-1）計算，跨年不需特別處理，也不必逐月建立 datetime
     # 如果本地沒有任何有效資料，從2025年9月開始（API可用的起始月份）
     if latest_date.year <= 2000:
         # API從2025年9月23日開始有資料
-        start_date = datetime(2025, 9, 1).replace(tzinfo=TAIPEI_TZ)
+        start_index = 2025 * 12 + (9 - 1)
         log(f"本地無有效資料，從2025年9月開始抓取", "INFO")
     else:
         # 從本地最新日期的「下一個月」開始
-        if latest_date.month == 12:
-            start_date = latest_date.replace(year=latest_date.year + 1, month=1, day=1)
-        else:
-            start_date = latest_date.replace(month=latest_date.month + 1, day=1)
+        start_index = latest_date.year * 12 + latest_date.month
     
     # 計算到「當前月份」為止
-    current = start_date.replace(day=1)
-    end = today.replace(day=1)  # 當前月份的第一天
+    end_index = today.year * 12 + (today.month - 1)
     
     # 如果起始月份已經在結束月份之後，則無需抓取
-    if current > end:
+    if start_index > end_index:
         log(f"無需抓取新月份（本地已是最新）", "INFO")
-        return months_needed
-    
-    while current <= end:
-        months_needed.append((current.year, current.month))
-        
-        # 計算下個月
-        if current.month == 12:
-            current = current.replace(year=current.year + 1, month=1)
-        else:
-            current = current.replace(month=current.month + 1)
+        return []
     
-    return months_needed
+    return [(index // 12, index % 12 + 1) for index in range(start_index, end_index + 1)]
 
-def crawl_game_incrementally(game_name: str, existing_draws: List[Dict]) -> List[Dict]:
+def crawl_game_incrementally(game_name: str, existing_draws: List[Dict],
+                             executor: Optional[ThreadPoolExecutor] = None) -> List[Dict]:
     """增量爬取指定遊戲的新資料"""
     log(f"開始增量爬取 {game_name}...", "INFO")
     
@@ -212,7 +287,7 @@ def crawl_game_incrementally(game_name: str, existing_draws: List[Dict]) -> List
         try:
             # 假設資料是按日期倒序排列的，最新的一筆在第一個
             latest_date_str = existing_draws[-1]['date']  # 因為是正序，最新在最後
-            latest_date = datetime.strptime(latest_date_str, '%Y-%m-%d').replace(tzinfo=TAIPEI_TZ)
+            latest_date = parse_ymd(latest_date_str).replace(tzinfo=TAIPEI_TZ)
             log(f"{game_name} 本地最新日期: {latest_date_str}", "INFO")
         except Exception as e:
             log(f"解析本地最新日期失敗: {e}，將從頭抓取", "WARNING")
@@ -227,18 +302,17 @@ def crawl_game_incrementally(game_name: str, existing_draws: List[Dict]) -> List
     
     log(f"{game_name} 需要抓取 {len(months_to_fetch)} 個月份: {months_to_fetch}", "INFO")
     
-    # 抓取每個月份的資料
+    # 並行抓取每個月份的資料
+    monthly_draws = fetch_game_months(game_name, months_to_fetch, executor)
+    
+    # 現有日期集合只需建立一次，供所有月份查重
+    existing_dates = set(d['date'] for d in existing_draws)
+    
     all_new_draws = []
-    for year, month in months_to_fetch:
-        month_draws = fetch_game_month_data(game_name, year, month)
-        
-        # 過濾掉可能重複的資料
-        existing_dates = set(d['date'] for d in existing_draws)
-        new_in_month = []
-        
-        for draw in month_draws:
-            if draw['date'] not in existing_dates:
-                new_in_month.append(draw)
+    for (year, month), month_draws in zip(months_to_fetch, monthly_draws):
+        # 過濾掉可能重複的資料（包含本次先前月份已接受的資料）
+        new_in_month = [draw for draw in month_draws if draw['date'] not in existing_dates]
+        existing_dates.update(draw['date'] for draw in new_in_month)
         
         if new_in_month:
             all_new_draws.extend(new_in_month)
@@ -247,9 +321,6 @@ def crawl_game_incrementally(game_name: str, existing_draws: List[Dict]) -> List
             log(f"{game_name} {year}/{month:02d} 無新資料（已存在）", "INFO")
         else:
             log(f"{game_name} {year}/{month:02d} 無資料", "INFO")
-        
-        # 尊重伺服器，避免請求過於頻繁
-        time.sleep(1)
     
     return all_new_draws
 
@@ -272,16 +343,25 @@ def main():
         # 增量爬取各遊戲新資料
         all_new_data = {}
         
-        for game_name in GAME_API_CONFIG.keys():
-            # 只處理有API的遊戲
-            if GAME_API_CONFIG[game_name].get("api_path"):
-                existing_draws = existing_data.get(game_name, [])
-                new_draws = crawl_game_incrementally(game_name, existing_draws)
-                
+        # 只處理有API的遊戲，沒有API端點的遊戲彙總成一行提示
+        api_games = [game_name for game_name, config in GAME_API_CONFIG.items() if config.api_path]
+        skipped_games = [game_name for game_name in GAME_API_CONFIG if game_name not in api_games]
+        if skipped_games:
+            log(f"{'、'.join(skipped_games)} 沒有API端點，跳過增量更新", "INFO")
+        
+        # 各遊戲同時爬取，所有月份請求共用同一個抓取執行緒池
+        with ThreadPoolExecutor(max_workers=MAX_FETCH_WORKERS) as fetch_executor, \
+                ThreadPoolExecutor(max_workers=max(len(api_games), 1)) as game_executor:
+            futures = {
+                game_name: game_executor.submit(
+                    crawl_game_incrementally, game_name,
+                    existing_data.get(game_name, []), fetch_executor)
+                for game_name in api_games
+            }
+            for game_name, future in futures.items():
+                new_draws = future.result()
                 if new_draws:
                     all_new_data[game_name] = new_draws
-            else:
-                log(f"{game_name} 沒有API端點，跳過增量更新", "INFO")
         
         # 合併與儲存
         if all_new_data:
@@ -294,16 +374,16 @@ def main():
                 log("❌ 資料儲存失敗，但新資料已抓取完成", "ERROR")
         else:
             log("ℹ️ 所有遊戲均無新資料，資料庫已是最新狀態。", "INFO")
-            # 即使無新資料，也更新時間戳記
-            if save_data(existing_data):
+            # 即使無新資料，也更新時間戳記（資料庫內容未變，不需重寫 lottery-data.json）
+            if save_update_info(existing_data):
                 success = True
             
     except KeyboardInterrupt:
         log("程式被使用者中斷", "WARNING")
     except Exception as e:
         log(f"程式執行發生未預期錯誤: {e}", "ERROR")
-        import traceback
-        traceback.print_exc()
+        # 完整追蹤訊息以單次寫入輸出到 stderr
+        sys.stderr.write(traceback.format_exc())
     
     print("=" * 70)
     return success